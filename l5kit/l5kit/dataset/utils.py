@@ -30,13 +30,19 @@ def convert_str_to_fixed_length_tensor(string: str, max_length: int = kMaxStrLen
     )
 
 
-def move_to_device(data: Dict[str, torch.Tensor], device: torch.device) -> Dict[str, torch.Tensor]:
+def move_to_device(data: Dict[str, torch.Tensor], device: torch.device,
+                   non_blocking: bool = False) -> Dict[str, torch.Tensor]:
     """Move the data dict to a given torch device
 
     :param data: the torch dict
     :param device: the device where to move each value of the dict
+    :param non_blocking: if True and device is a cuda device, values are moved asynchronously. This implies
+    copying cpu values into page-locked (pinned) host memory first, so that the copy can overlap with host work
     :return: the torch dict on the new device
     """
+    if non_blocking and device.type == "cuda":
+        return {k: (v.pin_memory() if v.device.type == "cpu" else v).to(device, non_blocking=True)
+                for k, v in data.items()}
     return {k: v.to(device) for k, v in data.items()}
 
 
@@ -1,7 +1,8 @@
 from .angle import angle_between_vectors, angular_distance, compute_yaw_around_north_from_direction
 from .image import crop_rectangle_from_image
-from .transform import (compute_agent_pose, ecef_to_geodetic, geodetic_to_ecef, rotation33_as_yaw, transform_point,
-                        transform_points, vertical_flip, yaw_as_rotation33)
+from .transform import (compute_agent_pose, ecef_to_geodetic, geodetic_to_ecef, rotation33_as_yaw,
+                        rotation33_as_yaw_batched, transform_point, transform_points, vertical_flip, yaw_as_rotation33,
+                        yaw_as_rotation33_batched)
 from .voxel import normalize_intensity, points_within_bounds, voxel_coords_to_intensity_grid
 
 
@@ -10,7 +11,9 @@ __all__ = [
     "compute_yaw_around_north_from_direction",
     "crop_rectangle_from_image",
     "rotation33_as_yaw",
+    "rotation33_as_yaw_batched",
     "yaw_as_rotation33",
+    "yaw_as_rotation33_batched",
     "vertical_flip",
     "transform_points",
     "transform_point",
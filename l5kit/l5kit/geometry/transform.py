@@ -37,6 +37,24 @@ def rotation33_as_yaw(rotation: np.ndarray) -> float:
     return cast(float, transforms3d.euler.mat2euler(rotation)[2])
 
 
+def rotation33_as_yaw_batched(rotations: np.ndarray) -> np.ndarray:
+    """Compute the yaw component of a batch of 3x3 rotation matrices.
+    This is the vectorised equivalent of calling `rotation33_as_yaw` on each matrix.
+
+    Args:
+        rotations (np.ndarray): (N, 3, 3) rotation matrices (np.float64 dtype recommended)
+
+    Returns:
+        np.ndarray: (N,) yaw rotations in radians
+    """
+    assert rotations.ndim == 3 and rotations.shape[1:] == (3, 3), f"expected (N, 3, 3), got {rotations.shape}"
+    cos_yaw_cy = rotations[:, 0, 0]
+    sin_yaw_cy = rotations[:, 1, 0]
+    # same as transforms3d: yaw is 0 when the matrix is in gimbal lock
+    cy = np.hypot(cos_yaw_cy, sin_yaw_cy)
+    return np.where(cy > np.finfo(float).eps * 4.0, np.arctan2(sin_yaw_cy, cos_yaw_cy), 0.0)
+
+
 def yaw_as_rotation33(yaw: float) -> np.ndarray:
     """Create a 3x3 rotation matrix from given yaw.
     The rotation is counter-clockwise and it is equivalent to:
@@ -53,6 +71,29 @@ def yaw_as_rotation33(yaw: float) -> np.ndarray:
     return transforms3d.euler.euler2mat(0, 0, yaw)
 
 
+def yaw_as_rotation33_batched(yaws: np.ndarray) -> np.ndarray:
+    """Create a batch of 3x3 rotation matrices from given yaws.
+    This is the vectorised equivalent of calling `yaw_as_rotation33` on each yaw.
+
+    Args:
+        yaws (np.ndarray): (N,) yaw rotations in radians
+
+    Returns:
+        np.ndarray: (N, 3, 3) rotation matrices
+    """
+    assert yaws.ndim == 1, f"expected (N,), got {yaws.shape}"
+    cos_yaws = np.cos(yaws)
+    sin_yaws = np.sin(yaws)
+
+    rotations = np.zeros((len(yaws), 3, 3), dtype=np.float64)
+    rotations[:, 0, 0] = cos_yaws
+    rotations[:, 0, 1] = -sin_yaws
+    rotations[:, 1, 0] = sin_yaws
+    rotations[:, 1, 1] = cos_yaws
+    rotations[:, 2, 2] = 1.0
+    return rotations
+
+
 def vertical_flip(tm: np.ndarray, y_dim_size: int) -> np.ndarray:
     """Return a new matrix that also performs a flip on the y axis.
 
@@ -77,6 +77,40 @@ def draw_boxes(
     return im
 
 
+def draw_boxes_channels(
+        raster_size: Tuple[int, int],
+        raster_from_world: np.ndarray,
+        agents_per_channel: List[np.ndarray],
+        color: int,
+) -> np.ndarray:
+    """ Draw boxes into multiple GRAY channels at once.
+    Boxes corners of all channels are extracted and projected on the image space in a single pass,
+    then cv2 draws the boxes of each channel in one sweep over that channel.
+
+    :param raster_size: Desired output raster image size
+    :param raster_from_world: Transformation matrix to transform from world to image coordinate
+    :param agents_per_channel: An array of agents to be drawn for each channel
+    :param color: Single int color
+    :return: the channels with agents rendered as a (C, H, W) GRAY image stack
+    """
+    im = np.zeros((len(agents_per_channel), raster_size[1], raster_size[0]), dtype=np.uint8)
+
+    non_empty_agents = [agents for agents in agents_per_channel if len(agents)]
+    if not len(non_empty_agents):
+        return im
+
+    box_world_coords = get_box_world_coords(np.concatenate(non_empty_agents))
+    box_raster_coords = transform_points(box_world_coords.reshape((-1, 2)), raster_from_world)
+
+    # fillPoly wants polys in a sequence with points inside as (x,y)
+    box_raster_coords = cv2_subpixel(box_raster_coords.reshape((-1, 4, 2)))
+    channel_ends = np.cumsum([len(agents) for agents in agents_per_channel])
+    for im_channel, channel_raster_coords in zip(im, np.split(box_raster_coords, channel_ends[:-1])):
+        if len(channel_raster_coords):
+            cv2.fillPoly(im_channel, channel_raster_coords, color=color, **CV2_SUB_VALUES)
+    return im
+
+
 class BoxRasterizer(Rasterizer):
     def __init__(
         self,
@@ -128,9 +162,9 @@ class BoxRasterizer(Rasterizer):
         raster_from_world = self.render_context.raster_from_world(ego_translation_m, ego_yaw_rad)
 
         # this ensures we always end up with fixed size arrays, +1 is because current time is also in the history
-        out_shape = (self.raster_size[1], self.raster_size[0], self.history_num_frames + 1)
-        agents_images = np.zeros(out_shape, dtype=np.uint8)
-        ego_images = np.zeros(out_shape, dtype=np.uint8)
+        num_channels = self.history_num_frames + 1
+        agents_per_channel: List[np.ndarray] = []
+        ego_per_channel: List[np.ndarray] = []
 
         for i, (frame, agents) in enumerate(zip(history_frames, history_agents)):
             agents = filter_agents_by_labels(agents, self.filter_agents_threshold)
@@ -145,12 +179,21 @@ class BoxRasterizer(Rasterizer):
                 if len(ego_agent) > 0:  # check if ego_agent is in the frame
                     agents = agents[agents != ego_agent[0]]  # remove ego_agent from agents
 
-            agents_images[..., i] = draw_boxes(self.raster_size, raster_from_world, agents, 255)
+            agents_per_channel.append(agents)
             if len(ego_agent) > 0 and (self.render_ego_history or i == 0):
-                ego_images[..., i] = draw_boxes(self.raster_size, raster_from_world, ego_agent, 255)
+                ego_per_channel.append(ego_agent)
+            else:
+                ego_per_channel.append(ego_agent[:0])
+
+        # frames missing from the history are left empty
+        empty_agents = agents_per_channel[0][:0]
+        agents_per_channel += [empty_agents] * (num_channels - len(agents_per_channel))
+        ego_per_channel += [empty_agents] * (num_channels - len(ego_per_channel))
 
         # combine such that the image consists of [agent_t, agent_t-1, agent_t-2, ego_t, ego_t-1, ego_t-2]
-        out_im = np.concatenate((agents_images, ego_images), -1)
+        # all boxes are projected together and each channel is drawn with a single cv2 call
+        out_im = draw_boxes_channels(self.raster_size, raster_from_world, agents_per_channel + ego_per_channel, 255)
+        out_im = out_im.transpose(1, 2, 0)  # C,0,1 -> 0,1,C
 
         return out_im.astype(np.float32) / 255
 
@@ -1,14 +1,17 @@
 from copy import deepcopy
-from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 import numpy as np
 
-from l5kit.data import filter_agents_by_frames, PERCEPTION_LABEL_TO_INDEX
+from l5kit.data import get_agents_slice_from_frames, PERCEPTION_LABEL_TO_INDEX
 from l5kit.dataset import EgoDataset
-from l5kit.geometry.transform import yaw_as_rotation33
+from l5kit.geometry.transform import yaw_as_rotation33_batched
 from l5kit.simulation.utils import disable_agents, get_frames_subset, insert_agent
 
 
+CAR_LABEL_INDEX = PERCEPTION_LABEL_TO_INDEX["PERCEPTION_LABEL_CAR"]  # resolved once, used on every agents filter
+
+
 class SimulationConfig(NamedTuple):
     """ Defines the parameters used for the simulation of ego and agents around it.
 
@@ -77,8 +80,7 @@ class SimulationDataset:
                 dataset_zarr = dt_ego.dataset
                 frame = dataset_zarr.frames[0]
                 ego_pos = frame["ego_translation"][:2]
-                agents = dataset_zarr.agents
-                frame_agents = filter_agents_by_frames(frame, agents)[0]
+                frame_agents = dataset_zarr.agents[get_agents_slice_from_frames(frame)]
                 frame_agents = self._filter_agents(scene_idx, frame_agents, ego_pos)
                 disable_agents(dataset_zarr, allowlist=frame_agents["track_id"])
 
@@ -86,24 +88,25 @@ class SimulationDataset:
         self.recorded_scene_dataset_batch = deepcopy(self.scene_dataset_batch)
 
     @staticmethod
-    def from_dataset_indices(dataset: EgoDataset, scene_indices: List[int],
+    def from_dataset_indices(dataset: EgoDataset, scene_indices: Union[List[int], np.ndarray],
                              sim_cfg: SimulationConfig) -> "SimulationDataset":
         """Create a SimulationDataset by picking indices from the provided dataset
 
         :param dataset: the EgoDataset
-        :param scene_indices: scenes from the EgoDataset to pick
+        :param scene_indices: scenes from the EgoDataset to pick, as a list or a 1D int array
         :param sim_cfg: a simulation config
         :return: the new SimulationDataset
         """
-        if len(np.unique(scene_indices)) != len(scene_indices):
+        scene_indices_arr = np.asarray(scene_indices, dtype=np.int64)
+        if len(np.unique(scene_indices_arr)) != len(scene_indices_arr):
             raise ValueError(f"can't simulate repeated scenes: {scene_indices}")
 
-        if np.any(np.asarray(scene_indices) >= len(dataset.dataset.scenes)):
+        if np.any(scene_indices_arr >= len(dataset.dataset.scenes)):
             raise ValueError(
                 f"can't pick indices {scene_indices} from dataset with length: {len(dataset.dataset.scenes)}")
 
         scene_dataset_batch: Dict[int, EgoDataset] = {}  # dicts preserve insertion order
-        for scene_idx in scene_indices:
+        for scene_idx in scene_indices_arr.tolist():  # plain ints as keys
             scene_dataset = dataset.get_scene_dataset(scene_idx)
             scene_dataset_batch[scene_idx] = scene_dataset
         return SimulationDataset(scene_dataset_batch, sim_cfg)
@@ -130,9 +133,16 @@ class SimulationDataset:
         :param state_index: the frame index
         :return: a list of dict from EgoDatasets
         """
+        # all scenes have been cut to the same length, so we can check bounds once for the whole batch
+        num_frames = len(self)
+        if not -num_frames <= state_index < num_frames:
+            raise IndexError(f"can't get frame {state_index} from scenes with length {num_frames}")
+        state_index = state_index % num_frames
+
         frame_batch = []
         for scene_idx, scene_dt in self.scene_dataset_batch.items():
-            frame = scene_dt[state_index]
+            # each EgoDataset holds a single scene, so we skip __getitem__ and its bisect
+            frame = scene_dt.get_frame(scene_index=0, state_index=state_index)
             frame["scene_index"] = scene_idx  # set the scene to the right index
             frame_batch.append(frame)
         return frame_batch
@@ -155,12 +165,13 @@ class SimulationDataset:
             raise ValueError(f"trying to mutate frame:{state_index} but length is:{len(self)}")
 
         position_m_batch = ego_translations[:, output_index, :]
-        angle_rad_batch = ego_yaws[:, output_index]
-        for i, (scene_dataset, position_m, angle_rad) in enumerate(
-            zip(self.scene_dataset_batch.values(), position_m_batch, angle_rad_batch)
+        # build all rotations at once, only the write back is done per scene
+        rotation_batch = yaw_as_rotation33_batched(ego_yaws[:, output_index])
+        for scene_dataset, position_m, rotation in zip(
+            self.scene_dataset_batch.values(), position_m_batch, rotation_batch
         ):
             scene_dataset.dataset.frames[state_index]["ego_translation"][:2] = position_m
-            scene_dataset.dataset.frames[state_index]["ego_rotation"] = yaw_as_rotation33(angle_rad)
+            scene_dataset.dataset.frames[state_index]["ego_rotation"] = rotation
 
     def set_agents(self, state_index: int, agents_infos: Dict[Tuple[int, int], np.ndarray]) -> None:
         """Set multiple agents in the scene datasets.
@@ -194,7 +205,8 @@ class SimulationDataset:
         dataset = self.scene_dataset_batch[scene_index]
         frame = dataset.dataset.frames[state_index]
 
-        frame_agents = filter_agents_by_frames(frame, dataset.dataset.agents)[0]
+        # agents are stored contiguously per frame, only those in this frame are candidates
+        frame_agents = dataset.dataset.agents[get_agents_slice_from_frames(frame)]
         frame_agents = self._filter_agents(scene_index, frame_agents, frame["ego_translation"][:2])
 
         # rasterise individual agents
@@ -242,25 +254,23 @@ class SimulationDataset:
         :param ego_pos: the ego position in this frame
         :return: the filtered agents
         """
-        # keep only vehicles
-        car_index = PERCEPTION_LABEL_TO_INDEX["PERCEPTION_LABEL_CAR"]
-        vehicle_mask = frame_agents["label_probabilities"][:, car_index]
+        # work on the needed columns only and gather the (large) agent records once at the end
+        car_probs = frame_agents["label_probabilities"][:, CAR_LABEL_INDEX]
+        centroids = frame_agents["centroid"]
+        track_ids = frame_agents["track_id"]
 
+        # keep only vehicles
         dt_agents_ths = self.scene_dataset_batch[scene_idx].cfg["raster_params"]["filter_agents_threshold"]
-        vehicle_mask = vehicle_mask > dt_agents_ths
-        frame_agents = frame_agents[vehicle_mask]
+        vehicle_mask = car_probs > dt_agents_ths
 
-        distance_mask = np.zeros(len(frame_agents), dtype=np.bool)
-        for idx_agent, agent in enumerate(frame_agents):
-            track_id = int(agent["track_id"])
+        tracked_ids = np.asarray([track_id for scene, track_id in self._agents_tracked if scene == scene_idx],
+                                 dtype=track_ids.dtype)
 
-            distance = np.linalg.norm(ego_pos - agent["centroid"])
-            # for distance use two thresholds
-            if (scene_idx, track_id) in self._agents_tracked:
-                # if we're already controlling this agent, th_far
-                distance_mask[idx_agent] = distance < self.sim_cfg.distance_th_far
-            else:
-                # if not, start controlling it only if in th_close
-                distance_mask[idx_agent] = distance < self.sim_cfg.distance_th_close
+        # for distance use two thresholds
+        # if we're already controlling this agent, th_far
+        # if not, start controlling it only if in th_close
+        distance_th = np.where(np.isin(track_ids, tracked_ids),
+                               self.sim_cfg.distance_th_far, self.sim_cfg.distance_th_close)
+        distance = np.linalg.norm(centroids - ego_pos, axis=-1)
 
-        return frame_agents[distance_mask]
+        return frame_agents[vehicle_mask & (distance < distance_th)]
@@ -1,6 +1,6 @@
 from collections import defaultdict
 from enum import IntEnum
-from typing import DefaultDict, Dict, List, NamedTuple, Optional, Set, Tuple
+from typing import DefaultDict, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 import numpy as np
 import torch
@@ -10,7 +10,7 @@ from tqdm.auto import tqdm
 from l5kit.data import AGENT_DTYPE, PERCEPTION_LABEL_TO_INDEX
 from l5kit.dataset import EgoDataset
 from l5kit.dataset.utils import move_to_device, move_to_numpy
-from l5kit.geometry import rotation33_as_yaw, transform_points
+from l5kit.geometry import rotation33_as_yaw_batched, transform_points
 from l5kit.simulation.dataset import SimulationConfig, SimulationDataset
 
 
@@ -76,6 +76,11 @@ class SimulationOutput:
         self.ego_ins_outs = ego_ins_outs[scene_id]
         self.agents_ins_outs = agents_ins_outs[scene_id]
 
+        # all agents controlled at some point during the simulation (empty if agents were not simulated)
+        track_ids = [agent_in_out.track_id
+                     for frame_ins_outs in self.agents_ins_outs for agent_in_out in frame_ins_outs]
+        self.tracked_track_ids = np.unique(np.asarray(track_ids, dtype=np.int64))
+
     def get_scene_id(self) -> int:
         """
         Get the scene index for this SimulationOutput
@@ -95,12 +100,11 @@ class SimulationOutput:
         translations = frames["ego_translation"]
         rotations = frames["ego_rotation"]
 
-        for idx_frame in range(len(frames)):
-            # TODO: there is a conversion from float64 to float32 here
-            trajectory_states[idx_frame, TrajectoryStateIndices.X] = translations[idx_frame, 0]
-            trajectory_states[idx_frame, TrajectoryStateIndices.Y] = translations[idx_frame, 1]
-            trajectory_states[idx_frame, TrajectoryStateIndices.THETA] = rotation33_as_yaw(rotations[idx_frame])
-            # TODO: we may need to fill other fields
+        # TODO: there is a conversion from float64 to float32 here
+        trajectory_states[:, TrajectoryStateIndices.X] = torch.from_numpy(translations[:, 0])
+        trajectory_states[:, TrajectoryStateIndices.Y] = torch.from_numpy(translations[:, 1])
+        trajectory_states[:, TrajectoryStateIndices.THETA] = torch.from_numpy(rotation33_as_yaw_batched(rotations))
+        # TODO: we may need to fill other fields
 
         return trajectory_states
 
@@ -134,13 +138,15 @@ class ClosedLoopSimulator:
 
         self.keys_to_exclude = set(keys_to_exclude)
 
-    def unroll(self, scene_indices: List[int]) -> List[SimulationOutput]:
+    def unroll(self, scene_indices: Union[List[int], np.ndarray]) -> List[SimulationOutput]:
         """
         Simulate the dataset for the given scene indices
-        :param scene_indices: the scene indices we want to simulate
+        :param scene_indices: the scene indices we want to simulate, as a list or a 1D int array
         :return: the simulated dataset
         """
         sim_dataset = SimulationDataset.from_dataset_indices(self.dataset, scene_indices, self.sim_cfg)
+        # keys of the simulation dataset follow scene_indices order as plain ints
+        scene_indices = list(sim_dataset.scene_dataset_batch)
 
         agents_ins_outs: DefaultDict[int, List[List[UnrollInputOutput]]] = defaultdict(list)
         ego_ins_outs: DefaultDict[int, List[UnrollInputOutput]] = defaultdict(list)
@@ -154,7 +160,8 @@ class ClosedLoopSimulator:
                 agents_input = sim_dataset.rasterise_agents_frame_batch(frame_index)
                 if len(agents_input):  # agents may not be available
                     agents_input_dict = default_collate(list(agents_input.values()))
-                    agents_output_dict = self.model_agents(move_to_device(agents_input_dict, self.device))
+                    agents_device_dict = move_to_device(agents_input_dict, self.device, non_blocking=True)
+                    agents_output_dict = self.model_agents(agents_device_dict)
 
                     # for update we need everything as numpy
                     agents_input_dict = move_to_numpy(agents_input_dict)
@@ -173,7 +180,7 @@ class ClosedLoopSimulator:
             if not self.sim_cfg.use_ego_gt:
                 ego_input = sim_dataset.rasterise_frame_batch(frame_index)
                 ego_input_dict = default_collate(ego_input)
-                ego_output_dict = self.model_ego(move_to_device(ego_input_dict, self.device))
+                ego_output_dict = self.model_ego(move_to_device(ego_input_dict, self.device, non_blocking=True))
 
                 ego_input_dict = move_to_numpy(ego_input_dict)
                 ego_output_dict = move_to_numpy(ego_output_dict)
@@ -217,8 +224,10 @@ class ClosedLoopSimulator:
 
         next_agents["label_probabilities"][:, PERCEPTION_LABEL_TO_INDEX["PERCEPTION_LABEL_CAR"]] = 1
 
-        for scene_idx, next_agent in zip(input_dict["scene_index"], next_agents):
-            agents_update_dict[(scene_idx, next_agent["track_id"])] = np.expand_dims(next_agent, 0)
+        # slices are views on next_agents, no record is copied out of the structured array
+        next_track_ids = next_agents["track_id"]
+        for idx_agent, scene_idx in enumerate(input_dict["scene_index"]):
+            agents_update_dict[(scene_idx, next_track_ids[idx_agent])] = next_agents[idx_agent: idx_agent + 1]
         dataset.set_agents(frame_idx, agents_update_dict)
 
     @staticmethod
@@ -9,7 +9,7 @@ from l5kit.configs import load_config_data
 from l5kit.data import ChunkedDataset, LocalDataManager
 from l5kit.data.zarr_utils import zarr_concat
 from l5kit.dataset import EgoDataset
-from l5kit.rasterization import build_rasterizer
+from l5kit.rasterization import build_rasterizer, Rasterizer
 
 
 @pytest.fixture(scope="session")
@@ -36,6 +36,18 @@ def cfg() -> dict:
     return load_config_data("./l5kit/tests/artefacts/config.yaml")
 
 
+@pytest.fixture(scope="session")
+def rasterizer(dmg: LocalDataManager) -> Rasterizer:
+    """
+    Get a rasterizer built from the artefacts config.
+    Note: the scope of this fixture is "session"-> the semantic map is loaded only once regardless the number of tests
+
+    Returns:
+        Rasterizer: the rasterizer object
+    """
+    return build_rasterizer(load_config_data("./l5kit/tests/artefacts/config.yaml"), dmg)
+
+
 @pytest.fixture(scope="session")
 def zarr_dataset(dmg: LocalDataManager) -> ChunkedDataset:
     zarr_path = dmg.require("single_scene.zarr")
@@ -57,8 +69,7 @@ def zarr_cat_dataset(dmg: LocalDataManager, tmp_path: Path) -> ChunkedDataset:
 
 
 @pytest.fixture(scope="function")
-def ego_cat_dataset(cfg: dict, dmg: LocalDataManager, zarr_cat_dataset: ChunkedDataset) -> EgoDataset:
-    rasterizer = build_rasterizer(cfg, dmg)
+def ego_cat_dataset(cfg: dict, rasterizer: Rasterizer, zarr_cat_dataset: ChunkedDataset) -> EgoDataset:
     return EgoDataset(cfg, zarr_cat_dataset, rasterizer)
 
 
@@ -48,3 +48,31 @@ def test_move_to_device_trivial() -> None:
     for k in out_dict:
         assert isinstance(out_dict[k], torch.Tensor)
         assert out_dict[k].device == torch.device("cpu")
+
+    # non_blocking is a no-op for non cuda devices
+    out_dict = move_to_device(in_dict, torch.device("cpu"), non_blocking=True)
+    for k in out_dict:
+        assert out_dict[k].device == torch.device("cpu")
+        assert torch.equal(out_dict[k], in_dict[k])
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires cuda")
+def test_move_to_device_non_blocking_cuda() -> None:
+    in_dict = {"k1": torch.arange(10), "k2": torch.ones(4)}
+    out_dict = move_to_device(in_dict, torch.device("cuda"), non_blocking=True)
+    torch.cuda.synchronize()
+    assert list(in_dict.keys()) == list(out_dict.keys())
+    for k in out_dict:
+        assert out_dict[k].device.type == "cuda"
+        assert torch.equal(out_dict[k].cpu(), in_dict[k])
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires cuda")
+def test_move_to_device_non_blocking_already_on_cuda() -> None:
+    # values already on cuda are not pinned and are moved as they are
+    cuda_dict = {"k1": torch.arange(10, device="cuda"), "k2": torch.arange(5)}
+    out_dict = move_to_device(cuda_dict, torch.device("cuda"), non_blocking=True)
+    torch.cuda.synchronize()
+    for k in out_dict:
+        assert out_dict[k].device.type == "cuda"
+        assert torch.equal(out_dict[k].cpu(), cuda_dict[k].cpu())
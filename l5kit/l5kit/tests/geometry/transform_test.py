@@ -2,7 +2,8 @@ import numpy as np
 import pytest
 import transforms3d
 
-from l5kit.geometry import transform_point, transform_points
+from l5kit.geometry import (rotation33_as_yaw, rotation33_as_yaw_batched, transform_point, transform_points,
+                            yaw_as_rotation33, yaw_as_rotation33_batched)
 
 
 def test_transform_batch_points() -> None:
@@ -106,6 +107,24 @@ def test_transform_points_revert_equivalence() -> None:
     np.testing.assert_almost_equal(input_points_recovered, input_points, decimal=10)
 
 
+def test_rotation33_as_yaw_batched() -> None:
+    # batched and single yaw extraction should match, also for generic rotations
+    angles = np.random.uniform(-np.pi, np.pi, (16, 3))
+    rotations = np.stack([transforms3d.euler.euler2mat(*roll_pitch_yaw) for roll_pitch_yaw in angles])
+    expected_yaws = np.asarray([rotation33_as_yaw(rotation) for rotation in rotations])
+    np.testing.assert_allclose(rotation33_as_yaw_batched(rotations), expected_yaws)
+
+    with pytest.raises(AssertionError):
+        rotation33_as_yaw_batched(rotations[0])
+
+
+def test_yaw_as_rotation33_batched() -> None:
+    yaws = np.random.uniform(-np.pi, np.pi, 16)
+    expected_rotations = np.stack([yaw_as_rotation33(yaw) for yaw in yaws])
+    np.testing.assert_allclose(yaw_as_rotation33_batched(yaws), expected_rotations, atol=1e-10)
+    np.testing.assert_allclose(rotation33_as_yaw_batched(yaw_as_rotation33_batched(yaws)), yaws)
+
+
 def test_wrong_input_shape() -> None:
     tf = np.eye(4)
 
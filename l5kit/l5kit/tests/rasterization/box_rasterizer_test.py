@@ -3,7 +3,7 @@ import pytest
 
 from l5kit.data import AGENT_DTYPE, ChunkedDataset, filter_agents_by_frames, LocalDataManager
 from l5kit.rasterization import build_rasterizer
-from l5kit.rasterization.box_rasterizer import draw_boxes, get_box_world_coords
+from l5kit.rasterization.box_rasterizer import draw_boxes, draw_boxes_channels, get_box_world_coords
 
 
 def test_empty_boxes() -> None:
@@ -34,6 +34,25 @@ def test_draw_boxes() -> None:
     assert np.allclose(im[centroid_2[1] - 5: centroid_2[1] + 5, centroid_2[0] - 5: centroid_2[0] + 5], 1)
 
 
+def test_draw_boxes_channels() -> None:
+    agents = np.zeros(3, dtype=AGENT_DTYPE)
+    agents["extent"] = (20, 20, 20)
+    agents["centroid"] = [(90, 100), (150, 160), (40, 30)]
+    agents["yaw"] = [0.0, 0.5, -1.0]
+
+    # drawing all channels at once should match drawing each channel on its own, empty ones included
+    agents_per_channel = [agents[:2], agents[:0], agents[2:], agents]
+    to_image_space = np.eye(3)
+    im = draw_boxes_channels((200, 200), to_image_space, agents_per_channel, color=255)
+
+    assert im.shape == (len(agents_per_channel), 200, 200)
+    for im_channel, channel_agents in zip(im, agents_per_channel):
+        assert np.array_equal(im_channel, draw_boxes((200, 200), to_image_space, channel_agents, color=255))
+
+    im = draw_boxes_channels((200, 200), to_image_space, [agents[:0]] * 2, color=255)
+    assert im.shape == (2, 200, 200) and im.sum() == 0
+
+
 @pytest.fixture(scope="module")
 def hist_data(zarr_dataset: ChunkedDataset) -> tuple:
     hist_frames = zarr_dataset.frames[100:111][::-1]  # reverse to get them as history
@@ -4,15 +4,15 @@ from typing import Dict
 import numpy as np
 import pytest
 
-from l5kit.data import (AGENT_DTYPE, ChunkedDataset, FRAME_DTYPE, get_frames_slice_from_scenes, LocalDataManager,
-                        SCENE_DTYPE, TL_FACE_DTYPE)
+from l5kit.data import (AGENT_DTYPE, ChunkedDataset, FRAME_DTYPE, get_frames_slice_from_scenes, SCENE_DTYPE,
+                        TL_FACE_DTYPE)
 from l5kit.dataset import EgoDataset
-from l5kit.geometry import rotation33_as_yaw
-from l5kit.rasterization import build_rasterizer
+from l5kit.geometry import rotation33_as_yaw_batched
+from l5kit.rasterization import Rasterizer
 from l5kit.simulation.dataset import SimulationConfig, SimulationDataset
 
 
-def test_simulation_dataset_build(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager,
+def test_simulation_dataset_build(zarr_cat_dataset: ChunkedDataset, rasterizer: Rasterizer,
                                   cfg: dict, tmp_path: Path) -> None:
     # modify one frame to ensure everything works also when scenes are different
     zarr_cat_dataset.frames = np.asarray(zarr_cat_dataset.frames)
@@ -20,7 +20,6 @@ def test_simulation_dataset_build(zarr_cat_dataset: ChunkedDataset, dmg: LocalDa
         frame_slice = get_frames_slice_from_scenes(zarr_cat_dataset.scenes)
         zarr_cat_dataset.frames[frame_slice.start]["ego_translation"] += np.random.randn(3)
 
-    rasterizer = build_rasterizer(cfg, dmg)
     ego_dataset = EgoDataset(cfg, zarr_cat_dataset, rasterizer)
     sim_cfg = SimulationConfig(use_ego_gt=True, use_agents_gt=True, disable_new_agents=False,
                                distance_th_far=30, distance_th_close=10)
@@ -39,11 +38,14 @@ def test_simulation_dataset_build(zarr_cat_dataset: ChunkedDataset, dmg: LocalDa
         assert k_1 == k_2
         assert np.allclose(v_1.dataset.frames["ego_translation"], v_2.dataset.frames["ego_translation"])
 
+    # scene indices can also be given as an array
+    sim_3 = SimulationDataset.from_dataset_indices(ego_dataset, np.arange(len(scene_indices)), sim_cfg)
+    assert list(sim_3.scene_dataset_batch.keys()) == scene_indices
+    assert all(isinstance(k, int) for k in sim_3.scene_dataset_batch)
 
-def test_invalid_simulation_dataset(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager,
-                                    cfg: dict, tmp_path: Path) -> None:
-    rasterizer = build_rasterizer(cfg, dmg)
 
+def test_invalid_simulation_dataset(zarr_cat_dataset: ChunkedDataset, rasterizer: Rasterizer,
+                                    cfg: dict, tmp_path: Path) -> None:
     scene_indices = [0, len(zarr_cat_dataset.scenes)]
 
     ego_dataset = EgoDataset(cfg, zarr_cat_dataset, rasterizer)
@@ -53,9 +55,7 @@ def test_invalid_simulation_dataset(zarr_cat_dataset: ChunkedDataset, dmg: Local
         SimulationDataset.from_dataset_indices(ego_dataset, scene_indices, sim_cfg)
 
 
-def test_simulation_ego(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager, cfg: dict, tmp_path: Path) -> None:
-    rasterizer = build_rasterizer(cfg, dmg)
-
+def test_simulation_ego(zarr_cat_dataset: ChunkedDataset, rasterizer: Rasterizer, cfg: dict, tmp_path: Path) -> None:
     scene_indices = list(range(len(zarr_cat_dataset.scenes)))
 
     ego_dataset = EgoDataset(cfg, zarr_cat_dataset, rasterizer)
@@ -75,25 +75,29 @@ def test_simulation_ego(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager,
         _ = dataset.rasterise_frame_batch(len(dataset))
 
     # ensure we can set the ego in multiple frames for all scenes
-    frame_indices = np.random.randint(0, len(dataset), 10)
-    for frame_idx in frame_indices:
-        mock_tr = np.random.rand(len(scene_indices), 12, 2)
-        mock_yaw = np.random.rand(len(scene_indices), 12)
-
+    # frames must be unique, otherwise a later set_ego would overwrite an earlier one before we check it
+    frame_indices = np.random.choice(len(dataset), 10, replace=False)
+    mock_tr_all = np.random.rand(len(frame_indices), len(scene_indices), 12, 2)
+    mock_yaw_all = np.random.rand(len(frame_indices), len(scene_indices), 12)
+    for frame_idx, mock_tr, mock_yaw in zip(frame_indices, mock_tr_all, mock_yaw_all):
         dataset.set_ego(frame_idx, 0, mock_tr, mock_yaw)
 
-        for scene_idx in scene_indices:
-            scene_zarr = dataset.scene_dataset_batch[scene_idx].dataset
-            ego_tr = scene_zarr.frames["ego_translation"][frame_idx]
-            ego_yaw = rotation33_as_yaw(scene_zarr.frames["ego_rotation"][frame_idx])
+    # stack all scenes once after the writes, then index the (F, S) pairs with a single fancy-index
+    ego_tr_all = np.stack([scene_dt.dataset.frames["ego_translation"]
+                           for scene_dt in dataset.scene_dataset_batch.values()])
+    ego_rot_all = np.stack([scene_dt.dataset.frames["ego_rotation"]
+                            for scene_dt in dataset.scene_dataset_batch.values()])
+    scene_ids = np.arange(len(scene_indices))
 
-            assert np.allclose(mock_tr[scene_idx, 0], ego_tr[:2])
-            assert np.allclose(mock_yaw[scene_idx, 0], ego_yaw)
+    ego_trs = ego_tr_all[scene_ids[None, :], frame_indices[:, None], :2]  # (F, S, 2)
+    ego_rots = ego_rot_all[scene_ids[None, :], frame_indices[:, None]]  # (F, S, 3, 3)
+    ego_yaws = rotation33_as_yaw_batched(ego_rots.reshape(-1, 3, 3)).reshape(ego_rots.shape[:2])
 
+    assert np.allclose(mock_tr_all[:, :, 0], ego_trs)
+    assert np.allclose(mock_yaw_all[:, :, 0], ego_yaws)
 
-def test_simulation_agents(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager, cfg: dict, tmp_path: Path) -> None:
-    rasterizer = build_rasterizer(cfg, dmg)
 
+def test_simulation_agents(zarr_cat_dataset: ChunkedDataset, rasterizer: Rasterizer, cfg: dict, tmp_path: Path) -> None:
     scene_indices = list(range(len(zarr_cat_dataset.scenes)))
 
     ego_dataset = EgoDataset(cfg, zarr_cat_dataset, rasterizer)
@@ -114,10 +118,8 @@ def test_simulation_agents(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManag
     assert len(dataset._agents_tracked) == len(agents_dict)
 
 
-def test_simulation_agents_mock(dmg: LocalDataManager, cfg: dict, tmp_path: Path) -> None:
+def test_simulation_agents_mock(rasterizer: Rasterizer, cfg: dict, tmp_path: Path) -> None:
     zarr_dataset = _mock_dataset()
-    rasterizer = build_rasterizer(cfg, dmg)
-
     ego_dataset = EgoDataset(cfg, zarr_dataset, rasterizer)
     sim_cfg = SimulationConfig(use_ego_gt=True, use_agents_gt=True, disable_new_agents=False,
                                distance_th_far=100, distance_th_close=10)
@@ -142,10 +144,8 @@ def test_simulation_agents_mock(dmg: LocalDataManager, cfg: dict, tmp_path: Path
     assert len(dataset._agents_tracked) == 0
 
 
-def test_simulation_agents_mock_disable(dmg: LocalDataManager, cfg: dict, tmp_path: Path) -> None:
+def test_simulation_agents_mock_disable(rasterizer: Rasterizer, cfg: dict, tmp_path: Path) -> None:
     zarr_dataset = _mock_dataset()
-    rasterizer = build_rasterizer(cfg, dmg)
-
     ego_dataset = EgoDataset(cfg, zarr_dataset, rasterizer)
     sim_cfg = SimulationConfig(use_ego_gt=True, use_agents_gt=True, disable_new_agents=True,
                                distance_th_far=100, distance_th_close=10)
@@ -172,10 +172,8 @@ def test_simulation_agents_mock_disable(dmg: LocalDataManager, cfg: dict, tmp_pa
     assert len(dataset._agents_tracked) == 0
 
 
-def test_simulation_agents_mock_insert(dmg: LocalDataManager, cfg: dict, tmp_path: Path) -> None:
+def test_simulation_agents_mock_insert(rasterizer: Rasterizer, cfg: dict, tmp_path: Path) -> None:
     zarr_dataset = _mock_dataset()
-    rasterizer = build_rasterizer(cfg, dmg)
-
     ego_dataset = EgoDataset(cfg, zarr_dataset, rasterizer)
     sim_cfg = SimulationConfig(use_ego_gt=True, use_agents_gt=True, disable_new_agents=True,
                                distance_th_far=100, distance_th_close=10)
@@ -206,34 +204,16 @@ def _mock_dataset() -> ChunkedDataset:
     zarr_dt.scenes["frame_index_interval"][0] = (0, 4)
 
     zarr_dt.frames = np.zeros(4, dtype=FRAME_DTYPE)
-    zarr_dt.frames["agent_index_interval"][0] = (0, 3)
-    zarr_dt.frames["agent_index_interval"][1] = (3, 5)
-    zarr_dt.frames["agent_index_interval"][2] = (5, 6)
-    zarr_dt.frames["agent_index_interval"][3] = (6, 6)
+    zarr_dt.frames["agent_index_interval"] = [(0, 3), (3, 5), (5, 6), (6, 6)]
 
     zarr_dt.agents = np.zeros(6, dtype=AGENT_DTYPE)
     # all agents except the first one are valid
     zarr_dt.agents["label_probabilities"][1:, 3] = 1
-    # FRAME 0
-    # second agent is close to ego and has id 1
-    zarr_dt.agents["track_id"][1] = 1
-    zarr_dt.agents["centroid"][1] = (1, 1)
-    # third agent is too far and has id 2
-    zarr_dt.agents["track_id"][2] = 2
-    zarr_dt.agents["centroid"][2] = (100, 100)
-
-    # FRAME 1
-    # track 1 agent is still close to ego
-    zarr_dt.agents["track_id"][3] = 1
-    zarr_dt.agents["centroid"][3] = (1, 2)
-    # track 2 is now close enough
-    zarr_dt.agents["track_id"][4] = 2
-    zarr_dt.agents["centroid"][4] = (1, 1)
-
-    # FRAME 2
-    # track 1 agent is far
-    zarr_dt.agents["track_id"][5] = 1
-    zarr_dt.agents["centroid"][5] = (100, 100)
+    # FRAME 0: track 1 is close to ego, track 2 is too far
+    # FRAME 1: track 1 is still close to ego, track 2 is now close enough
+    # FRAME 2: track 1 is far
+    zarr_dt.agents["track_id"][1:] = [1, 2, 1, 2, 1]
+    zarr_dt.agents["centroid"][1:] = [(1, 1), (100, 100), (1, 2), (1, 1), (100, 100)]
 
     # FRAME 3 is empty
 
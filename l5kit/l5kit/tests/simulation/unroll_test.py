@@ -4,11 +4,11 @@ import numpy as np
 import pytest
 import torch
 
-from l5kit.data import ChunkedDataset, filter_agents_by_track_id, get_frames_slice_from_scenes, LocalDataManager
+from l5kit.data import ChunkedDataset, get_frames_slice_from_scenes
 from l5kit.dataset import EgoDataset
-from l5kit.geometry import rotation33_as_yaw, yaw_as_rotation33
-from l5kit.rasterization import build_rasterizer
-from l5kit.simulation.unroll import ClosedLoopSimulator, SimulationConfig, SimulationDataset, TrajectoryStateIndices
+from l5kit.geometry import rotation33_as_yaw, rotation33_as_yaw_batched, yaw_as_rotation33
+from l5kit.rasterization import Rasterizer
+from l5kit.simulation.unroll import ClosedLoopSimulator, SimulationConfig, TrajectoryStateIndices
 
 
 class MockModel(torch.nn.Module):
@@ -20,6 +20,7 @@ class MockModel(torch.nn.Module):
         centroids = x["centroid"]
         bs = len(centroids)
 
+        # outputs must be fresh tensors: unroll keeps (views of) them for every step
         positions = torch.zeros(bs, 12, 2, device=centroids.device)
         positions[..., 0] = self.advance_x
 
@@ -63,9 +64,7 @@ def test_unroll_none_input(ego_cat_dataset: EgoDataset) -> None:
     assert isinstance(sim.model_agents, torch.nn.Sequential)
 
 
-def test_unroll(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager, cfg: dict) -> None:
-    rasterizer = build_rasterizer(cfg, dmg)
-
+def test_unroll(zarr_cat_dataset: ChunkedDataset, rasterizer: Rasterizer, cfg: dict) -> None:
     # change the first yaw of scene 1
     # this will break if some broadcasting happens
     zarr_cat_dataset.frames = np.asarray(zarr_cat_dataset.frames)
@@ -92,47 +91,49 @@ def test_unroll(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager, cfg: di
     # check ego movement
     for sim_output in sim_outputs:
         ego_tr = sim_output.simulated_ego["ego_translation"][: sim_cfg.num_simulation_steps, :2]
-        ego_dist = np.linalg.norm(np.diff(ego_tr, axis=0), axis=-1)
-        assert np.allclose(ego_dist, 1.0)
+        ego_dist_sq = ((ego_tr[1:] - ego_tr[:-1]) ** 2).sum(-1)
+        assert np.allclose(ego_dist_sq, 1.0)
 
         ego_tr = sim_output.simulated_ego_states[: sim_cfg.num_simulation_steps,
-                                                 TrajectoryStateIndices.X: TrajectoryStateIndices.Y + 1]
-        ego_dist = np.linalg.norm(np.diff(ego_tr.numpy(), axis=0), axis=-1)
-        assert np.allclose(ego_dist, 1.0, atol=1e-3)
+                                                 TrajectoryStateIndices.X: TrajectoryStateIndices.Y + 1].numpy()
+        ego_dist_sq = ((ego_tr[1:] - ego_tr[:-1]) ** 2).sum(-1)
+        assert np.allclose(ego_dist_sq, 1.0, atol=2e-3)
 
         # all rotations should be the same as the first one as the MockModel outputs 0 for that
         rots_sim = sim_output.simulated_ego["ego_rotation"][: sim_cfg.num_simulation_steps]
         r_rep = sim_output.recorded_ego["ego_rotation"][0]
-        for r_sim in rots_sim:
-            assert np.allclose(rotation33_as_yaw(r_sim), rotation33_as_yaw(r_rep), atol=1e-2)
+        assert (np.abs(rotation33_as_yaw_batched(rots_sim) - rotation33_as_yaw(r_rep)) < 1e-2).all()
 
         # all rotations should be the same as the first one as the MockModel outputs 0 for that
         rots_sim = sim_output.simulated_ego_states[: sim_cfg.num_simulation_steps, TrajectoryStateIndices.THETA]
         r_rep = sim_output.recorded_ego_states[0, TrajectoryStateIndices.THETA]
-        for r_sim in rots_sim:
-            assert np.allclose(r_sim, r_rep, atol=1e-2)
+        assert ((rots_sim - r_rep).abs() < 1e-2).all()
 
     # check agents movements
     for sim_output in sim_outputs:
-        # we need to know which agents were controlled during simulation
-        # TODO: this is not ideal, we should keep track of them through the simulation
-        sim_dataset = SimulationDataset.from_dataset_indices(ego_dataset, [sim_output.scene_id], sim_cfg)
-        sim_dataset.rasterise_agents_frame_batch(0)  # this will fill agents_tracked
+        # these are the agents controlled during simulation
+        assert len(sim_output.tracked_track_ids) > 0
+
+        # sort once by track_id, a stable sort keeps each track in frame order
+        states = sim_output.simulated_agents
+        order = np.argsort(states["track_id"], kind="stable")
+        sorted_track_ids = states["track_id"][order]
+
+        agents_tracks = sim_output.tracked_track_ids.astype(sorted_track_ids.dtype)
+        track_starts = np.searchsorted(sorted_track_ids, agents_tracks, side="left")
+        track_ends = np.searchsorted(sorted_track_ids, agents_tracks, side="right")
 
-        agents_tracks = [el[1] for el in sim_dataset._agents_tracked]
-        for track_id in agents_tracks:
-            states = sim_output.simulated_agents
-            agents = filter_agents_by_track_id(states, track_id)[: sim_cfg.num_simulation_steps]
-            agent_dist = np.linalg.norm(np.diff(agents["centroid"], axis=0), axis=-1)
-            assert np.allclose(agent_dist, 0.5)
+        for track_start, track_end in zip(track_starts, track_ends):
+            agents = states[order[track_start:track_end]][: sim_cfg.num_simulation_steps]
+            centroids = agents["centroid"]
+            agent_dist_sq = ((centroids[1:] - centroids[:-1]) ** 2).sum(-1)
+            assert np.allclose(agent_dist_sq, 0.5 ** 2)
 
 
 @pytest.mark.parametrize("frame_range",
                          [(1, 10), (10, 5), (240, None), pytest.param((250, 10), marks=pytest.mark.xfail)])
-def test_unroll_subset(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager, cfg: dict,
+def test_unroll_subset(zarr_cat_dataset: ChunkedDataset, rasterizer: Rasterizer, cfg: dict,
                        frame_range: Tuple[int, int]) -> None:
-    rasterizer = build_rasterizer(cfg, dmg)
-
     scene_indices = list(range(len(zarr_cat_dataset.scenes)))
     ego_dataset = EgoDataset(cfg, zarr_cat_dataset, rasterizer)
 
@@ -154,6 +155,11 @@ def test_unroll_subset(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager,
         assert zarr_cat_dataset.frames[0] != sim_out.recorded_dataset.dataset.frames[0]
         assert zarr_cat_dataset.frames[0] != sim_out.simulated_dataset.dataset.frames[0]
 
+        # outputs recorded at different steps must not alias the same memory
+        first_ego_out, last_ego_out = sim_out.ego_ins_outs[0].outputs, sim_out.ego_ins_outs[-1].outputs
+        assert not np.shares_memory(first_ego_out["positions"], last_ego_out["positions"])
+        assert not np.shares_memory(first_ego_out["yaws"], last_ego_out["yaws"])
+
         for ego_in_out in sim_out.ego_ins_outs:
             assert "positions" in ego_in_out.outputs and "yaws" in ego_in_out.outputs
             assert np.allclose(ego_in_out.outputs["positions"][:, 0], 1.0)
@@ -175,8 +181,8 @@ def test_unroll_subset(zarr_cat_dataset: ChunkedDataset, dmg: LocalDataManager,
             assert len(sim_out.ego_ins_outs) == len(sim_out.agents_ins_outs) == frame_range[1]
 
         ego_tr = sim_out.simulated_ego["ego_translation"][: sim_cfg.num_simulation_steps, :2]
-        ego_dist = np.linalg.norm(np.diff(ego_tr, axis=0), axis=-1)
-        assert np.allclose(ego_dist, 1.0)
+        ego_dist_sq = ((ego_tr[1:] - ego_tr[:-1]) ** 2).sum(-1)
+        assert np.allclose(ego_dist_sq, 1.0)
 
 
 def test_get_in_out_mock() -> None: